@@ -1,22 +1,66 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import pydeck as pdk
-import json
-from src.database import get_connection
+import orjson
+from src.database import get_connection, DB_PATH, TRACTS_PATH, COLOR_DESERT, COLOR_VISIBLE, DEMO_COLS
 
 st.set_page_config(layout="wide", page_title="Regional Grantmaker PoC")
 
+@st.cache_resource(ttl=3600, show_spinner=False)
+def load_tracts(db_mtime: float) -> pd.DataFrame:
+    # db_mtime is only a cache key: re-running the ETL rewrites the DB and
+    # sidecar, which bumps the mtime and forces a fresh read.
+    # cache_resource hands back the same frame instead of unpickling a copy
+    # per rerun, so callers must treat it as read-only.
+    if TRACTS_PATH.exists():
+        # ETL sidecar: geometry is already parsed into dicts
+        df = pd.read_pickle(TRACTS_PATH)
+    else:
+        # No sidecar: the git-tracked DB and utils/simulation.py builds never
+        # get a tracts.pkl (it is gitignored), so parse from SQLite
+        conn = get_connection()
+        df = pd.read_sql("SELECT * FROM vw_tract_profile ORDER BY overall_svi DESC", conn)
+        conn.close()
+        # Parse GeoJSON strings into Dicts for PyDeck
+        df['geometry'] = df['geometry'].map(orjson.loads)
+    return df
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_name_index(db_mtime: float) -> pd.DataFrame:
+    # Name -> row lookup for the Tract Inspector, built once per data version
+    # (first match wins on duplicate names). Shared like load_tracts(): read-only.
+    return load_tracts(db_mtime).drop_duplicates('name').set_index('name', drop=False)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_fill_colors(db_mtime: float, svi_threshold: float, show_deserts: bool) -> np.ndarray:
+    # Keyed on the slider/checkbox values so clicks and tab switches reuse the result
+    df = load_tracts(db_mtime)
+
+    # Base colors come pre-resolved from vw_tract_profile as packed 0xRRGGBBAA
+    packed = df['base_fill_color'].to_numpy(dtype=np.uint32)
+    if not show_deserts:
+        packed = np.where(packed == COLOR_DESERT, COLOR_VISIBLE, packed)
+
+    # [R, G, B, Alpha] per tract
+    colors = np.empty((len(df), 4), dtype=np.uint8)
+    colors[:, 0] = packed >> 24
+    colors[:, 1] = (packed >> 16) & 0xFF
+    colors[:, 2] = (packed >> 8) & 0xFF
+    colors[:, 3] = packed & 0xFF
+
+    # CHECK THE SLIDER (The "Dimming" Logic): Ghost Mode, Alpha 20 is barely visible
+    colors[df['overall_svi'].to_numpy() < svi_threshold] = [200, 200, 200, 20]
+    return colors
+
 # --- 0. STATE MANAGEMENT ---
 if "selected_tract" not in st.session_state:
     st.session_state.selected_tract = None
 
 # --- 1. DATA LOADING ---
 try:
-    conn = get_connection()
-    df = pd.read_sql("SELECT * FROM vw_tract_profile", conn)
-    conn.close()
-    # Parse GeoJSON strings into Dicts for PyDeck
-    df['geometry'] = df['geometry'].apply(json.loads)
+    db_mtime = max(p.stat().st_mtime for p in (DB_PATH, TRACTS_PATH) if p.exists())
+    df = load_tracts(db_mtime)
 except Exception as e:
     st.error("Database not found. Run 'src/etl.py' locally first!")
     st.stop()
@@ -37,51 +81,50 @@ with st.sidebar.expander("⚖️ Legal / Disclaimer", expanded=False):
 # --- 3. MAP LOGIC ---
 st.title("Regional Opportunity Map")
 
-display_df = df.copy() # <-- NEW
-
-def get_color(row):
-    # 1. CHECK THE SLIDER (The "Dimming" Logic)
-    if row['overall_svi'] < svi_threshold:
-        # Return a very transparent grey (Ghost Mode)
-        # [R, G, B, Alpha] -> Alpha 20 is barely visible
-        return [200, 200, 200, 20] 
-        
-    # 2. STANDARD LOGIC (For visible tracts)
-    if row['context_tag'] == 'Urgent Desert' and show_deserts:
-        return [200, 30, 30, 200]  # Red
-    elif row['context_tag'] == 'High-Capacity Hub':
-        return [30, 200, 30, 160]  # Green
-    else:
-        return [30, 100, 200, 140] # Blue (The standard "Visible" color)
-
-display_df['fill_color'] = display_df.apply(get_color, axis=1)
-
-# Define Layer
-layer = pdk.Layer(
-    "GeoJsonLayer", 
-    display_df,      # Use the full dataset
-    id="geojson", 
-    get_polygon="geometry", 
-    get_fill_color="fill_color",
-    # Dynamic Line Color: Hide lines for "Ghost" tracts to reduce clutter
-    get_line_color="[255, 255, 255, 80]", 
-    pickable=True, 
-    auto_highlight=True, 
-    opacity=0.8,
-    stroked=True,
-    get_line_width=20
-)
+by_name = get_name_index(db_mtime)
+
+# Only ship what the map draws, the tooltip, and the click handler read.
+# PyDeck serializes every column to the browser on each rerun.
+MAP_COLS = ['name', 'context_tag', 'overall_svi', 'geometry', 'fill_color']
+
+# Tab switches, dropdown picks, and map clicks rerun the script without
+# touching these inputs, so reuse this session's Deck instead of rebuilding
+# it (pdk.Layer converts the whole frame to records on construction)
+map_key = (db_mtime, svi_threshold, show_deserts)
+if st.session_state.get("map_key") != map_key:
+    # assign() returns a new frame sharing df's columns; df itself is never mutated.
+    # PyDeck serializes rows to JSON, so hand it plain lists
+    map_df = df.assign(fill_color=get_fill_colors(*map_key).tolist())
+
+    # Define Layer
+    layer = pdk.Layer(
+        "GeoJsonLayer", 
+        map_df[MAP_COLS],      # Every tract, map columns only
+        id="geojson", 
+        get_polygon="geometry", 
+        get_fill_color="fill_color",
+        # Dynamic Line Color: Hide lines for "Ghost" tracts to reduce clutter
+        get_line_color="[255, 255, 255, 80]", 
+        pickable=True, 
+        auto_highlight=True, 
+        opacity=0.8,
+        stroked=True,
+        get_line_width=20
+    )
 
-# UPDATED ZOOM: Centered to show Jefferson, Lewis, and St. Lawrence
-view_state = pdk.ViewState(latitude=44.2, longitude=-75.4, zoom=7.5)
+    # UPDATED ZOOM: Centered to show Jefferson, Lewis, and St. Lawrence
+    view_state = pdk.ViewState(latitude=44.2, longitude=-75.4, zoom=7.5)
 
-# RENDER MAP & CAPTURE CLICK
-event = st.pydeck_chart(
-    pdk.Deck(
+    st.session_state.map_deck = pdk.Deck(
         layers=[layer], 
         initial_view_state=view_state, 
         tooltip={"html": "<b>{name}</b><br/>Status: {context_tag}<br/>SVI: {overall_svi}"}
-    ),
+    )
+    st.session_state.map_key = map_key
+
+# RENDER MAP & CAPTURE CLICK
+event = st.pydeck_chart(
+    st.session_state.map_deck,
     on_select="rerun",           # Rerun app on click
     selection_mode="single-object"
 )
@@ -102,7 +145,7 @@ with col1:
     st.subheader("Priority Zones")
     display_cols = ['name', 'context_tag', 'overall_svi', 'count_assets']
     st.dataframe(
-        display_df[display_cols].sort_values('overall_svi', ascending=False), 
+        df[display_cols].sort_values('overall_svi', ascending=False), 
         hide_index=True, 
         use_container_width=True
     )
@@ -111,7 +154,7 @@ with col2:
     st.subheader("🔍 Tract Inspector")
     
     # Get list of valid names for the dropdown
-    available_names = list(display_df['name'].unique())
+    available_names = list(by_name.index)
     
     # LOGIC: Sync Dropdown with Map Click
     # If the clicked tract is in the current filtered list, set it as default.
@@ -133,21 +176,20 @@ with col2:
         
         # --- RENDER DETAILS ---
         # Safe Row Fetch
-        match = display_df[display_df['name'] == selected_name]
-        if match.empty:
+        try:
+            row = by_name.loc[selected_name]
+        except KeyError:
             st.warning("Selection not available in current filter.")
             st.stop()
-            
-        row = match.iloc[0]
 
         # --- NEW: TABBED INTERFACE ---
         tab_overview, tab_social, tab_capacity = st.tabs(["📊 Overview", "👥 Demographics", "🛠️ Capacity"])
         
-        # Parse JSON once
-        try:
-            d = json.loads(row['demographics_json'])
-        except:
-            d = {}
+        # Demographics are typed columns; drop NULLs (no ACS match, or fields
+        # utils/simulation.py doesn't fill) so the d.get() defaults still apply
+        d = {k: v for k, v in row[DEMO_COLS].items() if pd.notna(v)}
+        if 'total_pop' in d:
+            d['total_pop'] = int(d['total_pop'])
 
         with tab_overview:
             st.markdown(f"### {row['name']}")
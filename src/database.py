@@ -8,11 +8,27 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent 
 # Force DB to live in the Project Root, always.
 DB_PATH = BASE_DIR / "grant_maker.db"
+# Pickled vw_tract_profile with geometry pre-parsed (written by the ETL)
+TRACTS_PATH = BASE_DIR / "tracts.pkl"
+
+# --- MAP COLORS ---
+# Packed as (R << 24) | (G << 16) | (B << 8) | A so the view can store one INTEGER
+COLOR_DESERT = (200 << 24) | (30 << 16) | (30 << 8) | 200    # Red
+COLOR_HUB = (30 << 24) | (200 << 16) | (30 << 8) | 160       # Green
+COLOR_VISIBLE = (30 << 24) | (100 << 16) | (200 << 8) | 140  # Blue (The standard "Visible" color)
+
+# ACS demographics stored as typed raw_tracts columns (NULL when ACS has no match)
+DEMO_COLS = [
+    "total_pop", "pct_under_18", "pct_senior", "pct_white",
+    "pct_black", "pct_hispanic", "pct_uninsured", "pct_broadband",
+]
 
 def get_connection() -> Connection:
     # Connect to the absolute path
     conn = sqlite3.connect(str(DB_PATH)) 
     conn.row_factory = sqlite3.Row
+    # Fewer fsyncs per commit; the DB can always be rebuilt by the ETL
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
 def init_db():
@@ -32,38 +48,63 @@ def init_db():
             housing_svi REAL, 
             poverty_rate REAL, 
             pop_density REAL,
-            demographics_json JSON
+            count_assets INTEGER DEFAULT 0, -- materialized from raw_assets by the ETL
+            total_pop INTEGER,
+            pct_under_18 REAL,
+            pct_senior REAL,
+            pct_white REAL,
+            pct_black REAL,
+            pct_hispanic REAL,
+            pct_uninsured REAL,
+            pct_broadband REAL,
+            local_svi_rank INTEGER -- RANK() by overall_svi DESC, materialized by the ETL
         );
     """)
     # (Keep all other tables...)
     cursor.execute("CREATE TABLE IF NOT EXISTS raw_orgs (org_id TEXT PRIMARY KEY, name TEXT, budget INTEGER, years_operating INTEGER);")
     cursor.execute("CREATE TABLE IF NOT EXISTS raw_offices (office_id TEXT PRIMARY KEY, org_id TEXT, tract_id TEXT, office_type TEXT, FOREIGN KEY(org_id) REFERENCES raw_orgs(org_id));")
     cursor.execute("CREATE TABLE IF NOT EXISTS raw_assets (asset_id TEXT PRIMARY KEY, tract_id TEXT, type TEXT);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_assets_tract ON raw_assets(tract_id);")
     cursor.execute("CREATE TABLE IF NOT EXISTS raw_grants (grant_id TEXT PRIMARY KEY, org_id TEXT, amount INTEGER, status TEXT, theme TEXT);")
     cursor.execute("CREATE TABLE IF NOT EXISTS link_grant_area (link_id INTEGER PRIMARY KEY, grant_id TEXT, tract_id TEXT, pct_allocation REAL);")
 
     # --- REPORTING VIEW ---
     cursor.execute("DROP VIEW IF EXISTS vw_tract_profile")
-    cursor.execute("""
+    cursor.execute(f"""
     CREATE VIEW vw_tract_profile AS
+    SELECT
+        p.*,
+        -- Base map color, resolved once here instead of per rerun in the app
+        CASE p.context_tag
+            WHEN 'Urgent Desert' THEN {COLOR_DESERT}
+            WHEN 'High-Capacity Hub' THEN {COLOR_HUB}
+            ELSE {COLOR_VISIBLE}
+        END as base_fill_color
+    FROM (
     SELECT 
         t.tract_id, 
         t.name, 
         t.geometry, 
         t.overall_svi, 
         t.housing_svi,
-        t.demographics_json,
-        RANK() OVER (ORDER BY t.overall_svi DESC) as local_svi_rank,
-        COUNT(DISTINCT a.asset_id) as count_assets,
+        t.total_pop,
+        t.pct_under_18,
+        t.pct_senior,
+        t.pct_white,
+        t.pct_black,
+        t.pct_hispanic,
+        t.pct_uninsured,
+        t.pct_broadband,
+        t.local_svi_rank,
+        t.count_assets,
         CASE 
-            WHEN t.overall_svi > 0.75 AND COUNT(DISTINCT a.asset_id) < 2 THEN 'Urgent Desert'
-            WHEN t.overall_svi > 0.75 AND COUNT(DISTINCT a.asset_id) >= 4 THEN 'High-Capacity Hub'
+            WHEN t.overall_svi > 0.75 AND t.count_assets < 2 THEN 'Urgent Desert'
+            WHEN t.overall_svi > 0.75 AND t.count_assets >= 4 THEN 'High-Capacity Hub'
             WHEN t.overall_svi < 0.25 THEN 'Stable / Low Need'
             ELSE 'General Opportunity'
         END as context_tag
     FROM raw_tracts t
-    LEFT JOIN raw_assets a ON t.tract_id = a.tract_id
-    GROUP BY t.tract_id;
+    ) p;
     """)
 
     conn.commit()
@@ -73,4 +114,7 @@ def reset_db():
     # Delete the ABSOLUTE path file
     if DB_PATH.exists():
         os.remove(DB_PATH)
+    # The sidecar mirrors the DB; never let a stale one outlive it
+    if TRACTS_PATH.exists():
+        os.remove(TRACTS_PATH)
     init_db()
\ No newline at end of file
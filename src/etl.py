@@ -1,12 +1,16 @@
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import topojson as tp
 import pandas as pd
+import numpy as np
 import sqlite3
 import uuid
-import random
 import os
 from pathlib import Path
-from database import get_connection, reset_db
+from concurrent.futures import ThreadPoolExecutor
+from database import get_connection, reset_db, TRACTS_PATH, DEMO_COLS
 
 # --- DYNAMIC PATH CONFIGURATION ---
 # Get the directory where THIS script (etl.py) is located
@@ -26,6 +30,30 @@ STATE = "36"
 TIGER_URL = "https://tigerweb.geo.census.gov/arcgis/rest/services/TIGERweb/tigerWMS_Current/MapServer/8/query"
 ACS_URL = "https://api.census.gov/data/2023/acs/acs5/profile"
 
+# One pooled keep-alive session for all Census calls (TIGER + ACS); retries
+# transient failures with backoff. requests already asks for gzip by default.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
+# Geometry simplification tolerance (units: degrees)
+# ~0.0005 deg is ~50m, well below what shows at county zoom
+SIMPLIFY_TOLERANCE = 0.0005
+
+def simplify_tracts(features):
+    # Decimate shared arcs once (topojson) so adjacent tracts keep an identical
+    # edge; simplifying each polygon on its own leaves slivers and overlaps.
+    fc = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"geoid": f['geoid']}, "geometry": f['geometry']}
+        for f in features
+    ]}
+    topo = tp.Topology(fc, prequantize=False, toposimplify=SIMPLIFY_TOLERANCE)
+    simplified = {f['properties']['geoid']: f['geometry']
+                  for f in orjson.loads(topo.to_geojson())['features']}
+    return [{**f, 'geometry': simplified[f['geoid']]} for f in features]
+
 def fetch_regional_tracts():
     print(f"🌍 Fetching Geography for counties: {COUNTIES}...")
     # SQL-like IN clause for the API
@@ -37,8 +65,10 @@ def fetch_regional_tracts():
     }
     
     try:
-        resp = requests.get(TIGER_URL, params=params, timeout=30)
-        data = resp.json()
+        resp = SESSION.get(TIGER_URL, params=params, timeout=30)
+        resp.raise_for_status()
+        # orjson: the TIGER payload is mostly coordinate arrays, where it beats stdlib json
+        data = orjson.loads(resp.content)
         features = []
         for f in data.get('features', []):
             props = f.get('properties', {})
@@ -48,8 +78,12 @@ def fetch_regional_tracts():
                 features.append({
                     'geoid': geoid,
                     'name': props.get('NAME'),
-                    'geometry': json.dumps(f.get('geometry'))
+                    'geometry': f.get('geometry')
                 })
+        # Fewer vertices to store, parse, and ship to the browser
+        features = simplify_tracts(features)
+        for f in features:
+            f['geometry'] = orjson.dumps(f['geometry']).decode()
         print(f"✅ Loaded {len(features)} tracts.")
         return features
     except Exception as e:
@@ -63,29 +97,27 @@ def fetch_acs_demographics():
     params = {"get": vars, "for": "tract:*", "in": f"state:{STATE}"}
     
     try:
-        resp = requests.get(ACS_URL, params=params, timeout=30)
+        resp = SESSION.get(ACS_URL, params=params, timeout=30)
+        resp.raise_for_status()
         rows = resp.json()
-        data = {}
-        for r in rows[1:]:
-            geoid = r[-3] + r[-2] + r[-1]
-            if r[-2] not in COUNTIES: continue 
-            
-            total = int(r[0]) if r[0] else 0
-            if total == 0: continue
-
-            def pct(n): return round((int(n or 0)/total)*100, 1)
-            
-            data[geoid] = {
-                "total_pop": total,
-                "pct_under_18": pct(r[1]),
-                "pct_senior": pct(r[2]),
-                "pct_white": pct(r[3]),
-                "pct_black": pct(r[4]),
-                "pct_hispanic": pct(r[5]),
-                "pct_uninsured": float(r[6]) if r[6] else 0.0,
-                "pct_broadband": float(r[7]) if r[7] else 0.0
-            }
-        return data
+
+        # Whole response as one frame; filter and derive percentages column-wise
+        df = pd.DataFrame(rows[1:], columns=[
+            'total', 'u18', 'senior', 'white', 'black', 'hispanic',
+            'uninsured', 'broadband', 'state', 'county', 'tract'])
+        total = pd.to_numeric(df['total'], errors='coerce').fillna(0).astype(int)
+        df = df[df['county'].isin(COUNTIES) & (total > 0)].assign(total_pop=total)
+
+        for col, src in [('pct_under_18', 'u18'), ('pct_senior', 'senior'), ('pct_white', 'white'),
+                         ('pct_black', 'black'), ('pct_hispanic', 'hispanic')]:
+            counts = pd.to_numeric(df[src], errors='coerce').fillna(0)
+            df[col] = (counts / df['total_pop'] * 100).round(1)
+        # Already percentages in the ACS profile
+        for col, src in [('pct_uninsured', 'uninsured'), ('pct_broadband', 'broadband')]:
+            df[col] = pd.to_numeric(df[src], errors='coerce').fillna(0.0)
+
+        df.index = df['state'] + df['county'] + df['tract']
+        return df[DEMO_COLS].to_dict('index')
     except Exception as e:
         print(f"❌ ACS Error: {e}")
         return {}
@@ -110,18 +142,12 @@ def load_svi_data():
             print(f"Columns found: {df.columns.tolist()}")
             return {}
 
-        # 3. Create Mapping
-        svi_map = {}
-        for _, row in df.iterrows():
-            fips = str(row[fips_col])
-            try:
-                val = float(row[svi_col])
-                # Filter out -999 (CDC missing data code)
-                if val >= 0 and val <= 1:
-                    svi_map[fips] = val
-            except:
-                continue
-                
+        # 3. Create Mapping (unparseable values become NaN and fail the range check)
+        vals = pd.to_numeric(df[svi_col], errors='coerce')
+        # Filter out -999 (CDC missing data code)
+        mask = vals.between(0, 1)
+        svi_map = dict(zip(df.loc[mask, fips_col].astype(str), vals[mask]))
+
         print(f"✅ Mapped SVI for {len(svi_map)} tracts.")
         return svi_map
 
@@ -129,47 +155,65 @@ def load_svi_data():
         print(f"⚠️ SVI CSV Load Error: {e}")
         return {}
 
+def simulate_asset_counts(svi_arr, rand_arr):
+    # Weights [svi*5, (1-svi)*5] over [0, 3] reduce to P(0 assets) = svi.
+    # rand_arr holds one uniform [0, 1) draw per tract; svi_arr is already
+    # in [0, 1] (load_svi_data filters the CSV, missing tracts default to 0.5).
+    return np.where(rand_arr < svi_arr, 0, 3).astype(np.int32)
+
 def run_etl():
     reset_db()
     conn = get_connection()
     cursor = conn.cursor()
     
-    # 1. Gather Data
-    tracts = fetch_regional_tracts()
-    demos = fetch_acs_demographics()
-    svi_map = load_svi_data()
+    # 1. Gather Data (independent network/disk reads, so fetch them concurrently)
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        f_tracts = ex.submit(fetch_regional_tracts)
+        f_demos = ex.submit(fetch_acs_demographics)
+        f_svi = ex.submit(load_svi_data)
+    tracts, demos, svi_map = f_tracts.result(), f_demos.result(), f_svi.result()
     
     print("💾 Saving to Database...")
-    for t in tracts:
-        tid = t['geoid']
-        
-        # A. SVI Logic: Use Real CSV, or default to 0.5 (Average)
-        svi = svi_map.get(tid, 0.5)
-        
-        # B. Demo Logic: Use Real ACS, or empty dict
-        d = demos.get(tid, {})
-        
-        # C. Insert Tract
-        cursor.execute(
-            "INSERT INTO raw_tracts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (tid, f"Tract {t['name']}", t['geometry'], svi, 
-             0.0, 0.0, 0.0, json.dumps(d))
-        )
-        
-        # D. Asset Simulation (For "Hub vs Desert" Logic)
-        # Since we lack real asset data for 3 counties, we simulate based on SVI
-        # High SVI = High chance of Desert (0 assets)
-        # Low SVI = High chance of Hub (3+ assets)
-        weights = [svi*5, (1-svi)*5]
-        num_assets = random.choices([0, 3], weights=weights, k=1)[0]
-        
-        assets_types = ['School', 'Library', 'Clinic', 'Community Center']
-        for _ in range(num_assets):
-            cursor.execute("INSERT INTO raw_assets VALUES (?, ?, ?)",
-                           (str(uuid.uuid4()), tid, random.choice(assets_types)))
+    tract_ids = [t['geoid'] for t in tracts]
+
+    # A. SVI Logic: Use Real CSV, or default to 0.5 (Average)
+    svi_arr = np.array([svi_map.get(tid, 0.5) for tid in tract_ids], dtype=float)
+    # RANK() OVER (ORDER BY overall_svi DESC): 1 + number of tracts with higher SVI
+    svi_rank = len(svi_arr) - np.searchsorted(np.sort(svi_arr), svi_arr, side='right') + 1
+
+    # B. Asset Simulation (For "Hub vs Desert" Logic)
+    # Since we lack real asset data for 3 counties, we simulate based on SVI
+    # High SVI = High chance of Desert (0 assets)
+    # Low SVI = High chance of Hub (3+ assets)
+    rng = np.random.default_rng()
+    num_assets = simulate_asset_counts(svi_arr, rng.random(len(tract_ids)))
+
+    assets_types = ['School', 'Library', 'Clinic', 'Community Center']
+    asset_tracts = np.repeat(np.array(tract_ids, dtype=object), num_assets).tolist()
+    asset_kinds = rng.choice(assets_types, size=len(asset_tracts)).tolist()
+    asset_rows = [(str(uuid.uuid4()), tid, kind) for tid, kind in zip(asset_tracts, asset_kinds)]
+
+    # C. Queue Tracts (Demo Logic: Use Real ACS, or NULLs)
+    # count_assets is stored on the tract so the view needs no join
+    tract_rows = [
+        (tid, f"Tract {t['name']}", t['geometry'], svi, 0.0, 0.0, 0.0, n,
+         *(demos.get(tid, {}).get(c) for c in DEMO_COLS), rank)
+        for tid, t, svi, n, rank in zip(tract_ids, tracts, svi_arr.tolist(),
+                                        num_assets.tolist(), svi_rank.tolist())
+    ]
+
+    # D. Bulk insert in a single transaction (commits on exit)
+    with conn:
+        cursor.executemany("INSERT INTO raw_tracts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", tract_rows)
+        cursor.executemany("INSERT INTO raw_assets VALUES (?, ?, ?)", asset_rows)
 
-    conn.commit()
     count = cursor.execute("SELECT count(*) FROM raw_tracts").fetchone()[0]
+
+    # Sidecar for the app: parse the GeoJSON once here instead of on every load
+    # Highest-need first, so the app's dropdown order needs no sort
+    profile = pd.read_sql("SELECT * FROM vw_tract_profile ORDER BY overall_svi DESC", conn)
+    profile['geometry'] = profile['geometry'].map(orjson.loads)
+    profile.to_pickle(TRACTS_PATH)
     conn.close()
     print(f"🚀 ETL Complete: Database populated with {count} tracts.")
 
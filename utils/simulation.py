@@ -3,7 +3,7 @@ import requests
 import json
 import random
 import uuid
-from src.database import get_connection, reset_db
+from src.database import get_connection, reset_db, DEMO_COLS
 
 # --- CONFIGURATION ---
 STATE = "36"   # NY
@@ -157,17 +157,27 @@ def run_simulation():
             svi = round(random.uniform(0.5, 0.95), 2) if is_urban else round(random.uniform(0.1, 0.6), 2)
         
         cursor.execute(
-            "INSERT INTO raw_tracts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (tid, f"Tract {t['name']}", t['geometry'], svi, 0.0, 0.0, 0.0, json.dumps(d))
+            "INSERT INTO raw_tracts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (tid, f"Tract {t['name']}", t['geometry'], svi, 0.0, 0.0, 0.0, 0,
+             *(d.get(c) for c in DEMO_COLS), None)
         )
         tract_ids.append((tid, svi))
 
+    # Materialize the SVI rank now that every tract is in
+    cursor.execute("""
+        UPDATE raw_tracts SET local_svi_rank = (
+            SELECT COUNT(*) + 1 FROM raw_tracts r2 WHERE r2.overall_svi > raw_tracts.overall_svi
+        )
+    """)
+
     # 3. Simulate Assets (Capacity)
     assets_types = ['Library', 'School', 'Community Center', 'Park', 'Clinic']
     for tid, svi in tract_ids:
         # High Need (SVI) = High Risk of 'Desert' (Fewer Assets)
         weights = [svi*6, svi*3, (1-svi)*2, (1-svi)*4]
         num_assets = random.choices([0, 1, 2, 4], weights=weights, k=1)[0]
+        # Keep the materialized count on the tract in sync
+        cursor.execute("UPDATE raw_tracts SET count_assets = ? WHERE tract_id = ?", (num_assets, tid))
         
         for _ in range(num_assets):
             cursor.execute("INSERT INTO raw_assets VALUES (?, ?, ?)",